@@ -14,6 +14,8 @@ from collections import OrderedDict
 import six
 import attr
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 import pyblish.api
 from ayon_core.pipeline.publish import (
@@ -30,6 +32,34 @@ from .lib import get_ayon_render_job_envs, get_instance_job_envs
 JSONDecodeError = getattr(json.decoder, "JSONDecodeError", ValueError)
 
 
+def _create_session():
+    """Create session shared by all requests to Deadline Webservice.
+
+    Keep-alive connections are reused across job submissions so only the
+    first request to the Webservice pays for TCP/TLS handshake. Requests
+    failing on gateway errors are retried, POST requests only when
+    the connection could not be established.
+
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False,
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSION = _create_session()
+
+
 def requests_post(*args, **kwargs):
     """Wrap request post method.
 
@@ -48,7 +78,7 @@ def requests_post(*args, **kwargs):
         kwargs["auth"] = tuple(auth)  # explicit cast to tuple
     # add 10sec timeout before bailing out
     kwargs['timeout'] = 10
-    return requests.post(*args, **kwargs)
+    return _SESSION.post(*args, **kwargs)
 
 
 def requests_get(*args, **kwargs):
@@ -69,7 +99,7 @@ def requests_get(*args, **kwargs):
         kwargs["auth"] = tuple(auth)
     # add 10sec timeout before bailing out
     kwargs['timeout'] = 10
-    return requests.get(*args, **kwargs)
+    return _SESSION.get(*args, **kwargs)
 
 
 class DeadlineKeyValueVar(dict):
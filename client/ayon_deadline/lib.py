@@ -43,3 +43,56 @@ def get_instance_job_envs(instance) -> "dict[str, str]":
         env = dict(sorted(env.items()))
 
     return env
+
+
+def get_last_versions_by_folder(
+    project_name: str, folder_ids: "set[str]"
+) -> "dict[str, dict[str, int]]":
+    """Get last version numbers of all products in given folders.
+
+    Queries AYON server only twice regardless of count of folders and
+    products.
+
+    Args:
+        project_name (str): Project name.
+        folder_ids (set[str]): Folder ids.
+
+    Returns:
+        dict[str, dict[str, int]]: Last version number by product name
+            for each of passed folder ids. Products without any version
+            are not included.
+
+    """
+    import ayon_api
+
+    last_versions_by_folder = {folder_id: {} for folder_id in folder_ids}
+    if not folder_ids:
+        return last_versions_by_folder
+
+    products_by_id = {
+        product["id"]: product
+        for product in ayon_api.get_products(
+            project_name,
+            folder_ids=folder_ids,
+            fields={"id", "name", "folderId"},
+            # match 'get_last_version_by_product_name' which finds
+            #   inactive products too
+            active=None
+        )
+    }
+    if not products_by_id:
+        return last_versions_by_folder
+
+    last_versions = ayon_api.get_last_versions(
+        project_name,
+        set(products_by_id),
+        fields={"version", "productId"}
+    )
+    for product_id, version_entity in last_versions.items():
+        if not version_entity:
+            continue
+        product = products_by_id[product_id]
+        last_versions_by_folder[product["folderId"]][product["name"]] = int(
+            version_entity["version"]
+        )
+    return last_versions_by_folder
@@ -252,6 +252,7 @@ class CelactionSubmitDeadline(pyblish.api.InstancePlugin):
         """
         if not instance.data.get("expectedFiles"):
             instance.data["expectedFiles"] = []
+        instance.data["expectedFilesKind"] = "file_list"
 
         dirpath = os.path.dirname(filepath)
         filename = os.path.basename(filepath)
@@ -1,12 +1,8 @@
 # -*- coding: utf-8 -*-
 """Submit publishing job to farm."""
 import os
-import json
 import re
-from copy import deepcopy
 
-import clique
-import ayon_api
 import pyblish.api
 
 from ayon_core.pipeline import publish
@@ -20,7 +16,30 @@ from ayon_core.pipeline.farm.pyblish_functions import (
     prepare_representations,
     create_metadata_path
 )
-from ayon_deadline.abstract_submit_deadline import requests_post
+
+from ayon_deadline.lib import get_last_versions_by_folder
+
+
+# Prebuilt indexed JobInfo keys, covering usual count of dependencies and
+#   environment variables of publish job
+_JOB_DEPENDENCY_KEYS = tuple(f"JobDependency{i}" for i in range(64))
+_ENVIRONMENT_KEY_VALUE_KEYS = tuple(
+    f"EnvironmentKeyValue{i}" for i in range(64)
+)
+
+# Translation table converting backslashes to forward slashes
+_SLASH_TABLE = str.maketrans("\\", "/")
+
+
+def _get_indexed_keys(keys, prefix, count):
+    """Get indexed keys for `count` values, to be zipped with them.
+
+    Prebuilt `keys` are returned as they are when they cover `count`,
+    only keys past their end are formatted.
+    """
+    if count <= len(keys):
+        return keys
+    return keys + tuple(f"{prefix}{i}" for i in range(len(keys), count))
 
 
 def get_resource_files(resources, frame_range=None):
@@ -36,16 +55,17 @@ def get_resource_files(resources, frame_range=None):
         list of str: list of collected resources
 
     """
+    import clique
+
     res_collections, _ = clique.assemble(resources)
-    assert len(res_collections) == 1, "Multiple collections found"
+    if len(res_collections) != 1:
+        raise ValueError("Multiple collections found")
     res_collection = res_collections[0]
 
     # Remove any frames
     if frame_range is not None:
         for frame in frame_range:
-            if frame not in res_collection.indexes:
-                continue
-            res_collection.indexes.remove(frame)
+            res_collection.indexes.discard(frame)
 
     return list(res_collection)
 
@@ -77,6 +97,10 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
 
         - expectedFiles (list or dict): explained below
 
+        - expectedFilesKind (str, Optional): "aov_map" if `expectedFiles`
+            contain dictionaries of AOVs, "file_list" otherwise. Detected
+            from `expectedFiles` when not set.
+
     """
 
     label = "Submit Image Publishing job to Deadline"
@@ -162,29 +186,68 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
     # poor man exclusion
     skip_integration_repre_list = []
 
-    def _submit_deadline_post_job(self, instance, job, instances):
-        """Submit publish job to Deadline.
+    # compiled patterns of 'aov_filter', see '_get_aov_filter'
+    _aov_filter_compiled = None
+    _aov_filter_source = None
+
+    @classmethod
+    def _get_aov_filter(cls):
+        """Get 'aov_filter' as mapping of host name to compiled patterns.
+
+        Patterns are compiled only once for each 'aov_filter' value, which
+        is replaced when project settings are applied.
 
         Returns:
-            (str): deadline_publish_job_id
+            dict[str, list[re.Pattern]]: Compiled patterns by host name.
+        """
+        if cls._aov_filter_source is not cls.aov_filter:
+            cls._aov_filter_compiled = {
+                item["name"]: [
+                    re.compile(pattern) for pattern in item["value"]
+                ]
+                for item in cls.aov_filter
+            }
+            cls._aov_filter_source = cls.aov_filter
+        return cls._aov_filter_compiled
+
+    def _submit_deadline_post_job(self, instance, job, instances,
+                                  publish_job, metadata_path,
+                                  rootless_metadata_path):
+        """Queue publish job for submission to Deadline.
+
+        Publish jobs of all instances in the context are submitted at once
+        by 'SubmitQueuedPublishJobs', which also writes the metadata file
+        with id of the submitted Deadline publish job.
+
+        Args:
+            instance (pyblish.api.Instance): Instance data.
+            job (dict): Deadline render job the publish job depends on.
+            instances (list[dict]): Instances to publish on farm.
+            publish_job (dict): Metadata written to `metadata_path`.
+            metadata_path (str): Path to publish metadata json file.
+            rootless_metadata_path (str): Rootless `metadata_path` passed
+                to the publish job.
         """
-        data = instance.data.copy()
-        product_name = data["productName"]
+        instance_data = instance.data
+        context_data = instance.context.data
+
+        product_name = instance_data["productName"]
         job_name = "Publish - {}".format(product_name)
 
-        anatomy = instance.context.data['anatomy']
+        anatomy = context_data['anatomy']
 
         # instance.data.get("productName") != instances[0]["productName"]
         # 'Main' vs 'renderMain'
         override_version = None
-        instance_version = instance.data.get("version")  # take this if exists
+        instance_version = instance_data.get("version")  # take this if exists
         if instance_version != 1:
             override_version = instance_version
 
         output_dir = self._get_publish_folder(
             anatomy,
-            deepcopy(instance.data["anatomyData"]),
-            instance.data.get("folderEntity"),
+            # only top level keys are changed, shallow copy is enough
+            dict(instance_data["anatomyData"]),
+            instance_data.get("folderEntity"),
             instances[0]["productName"],
             instance.context,
             instances[0]["productType"],
@@ -193,32 +256,12 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
 
         # Transfer the environment from the original job to this dependent
         # job so they use the same environment
-        metadata_path, rootless_metadata_path = \
-            create_metadata_path(instance, anatomy)
+        environment = self._get_publish_job_environment(instance.context)
+        settings_variant = environment["AYON_DEFAULT_SETTINGS_VARIANT"]
 
-        settings_variant = os.environ["AYON_DEFAULT_SETTINGS_VARIANT"]
-        environment = {
-            "AYON_PROJECT_NAME": instance.context.data["projectName"],
-            "AYON_FOLDER_PATH": instance.context.data["folderPath"],
-            "AYON_TASK_NAME": instance.context.data["task"],
-            "AYON_USERNAME": instance.context.data["user"],
-            "AYON_LOG_NO_COLORS": "1",
-            "AYON_IN_TESTS": str(int(is_in_tests())),
-            "AYON_PUBLISH_JOB": "1",
-            "AYON_RENDER_JOB": "0",
-            "AYON_REMOTE_PUBLISH": "0",
-            "AYON_BUNDLE_NAME": os.environ["AYON_BUNDLE_NAME"],
-            "AYON_DEFAULT_SETTINGS_VARIANT": settings_variant,
-        }
-
-        # add environments from self.environ_keys
-        for env_key in self.environ_keys:
-            if os.getenv(env_key):
-                environment[env_key] = os.environ[env_key]
+        priority = self.deadline_priority or instance_data.get("priority", 50)
 
-        priority = self.deadline_priority or instance.data.get("priority", 50)
-
-        instance_settings = self.get_attr_values_from_data(instance.data)
+        instance_settings = self.get_attr_values_from_data(instance_data)
         initial_status = instance_settings.get("publishJobState", "Active")
 
         args = [
@@ -233,17 +276,50 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         if settings_variant == "staging":
             args.append("--use-staging")
 
-        # Generate the payload for Deadline submission
+        # add assembly jobs as dependencies
+        dependency_ids = []
+        if instance_data.get("tileRendering"):
+            self.log.info("Adding tile assembly jobs as dependencies...")
+            dependency_ids = instance_data.get("assemblySubmissionJobs")
+        elif instance_data.get("bakingSubmissionJobs"):
+            self.log.info(
+                "Adding baking submission jobs as dependencies..."
+            )
+            dependency_ids = instance_data["bakingSubmissionJobs"]
+        elif job.get("_id"):
+            dependency_ids = [job["_id"]]
+
+        dependency_items = dict(zip(
+            _get_indexed_keys(
+                _JOB_DEPENDENCY_KEYS, "JobDependency", len(dependency_ids)
+            ),
+            dependency_ids
+        ))
+        environment_items = dict(zip(
+            _get_indexed_keys(
+                _ENVIRONMENT_KEY_VALUE_KEYS,
+                "EnvironmentKeyValue",
+                len(environment)
+            ),
+            (f"{key}={value}" for key, value in environment.items())
+        ))
+
+        secondary_pool_items = {}
         secondary_pool = (
-            self.deadline_pool_secondary or instance.data.get("secondaryPool")
+            self.deadline_pool_secondary or instance_data.get("secondaryPool")
         )
+        if secondary_pool:
+            secondary_pool_items["SecondaryPool"] = secondary_pool
+
+        # Generate the payload for Deadline submission, JobInfo is composed
+        #   with all its keys at once
         payload = {
             "JobInfo": {
                 "Plugin": "Ayon",
                 "BatchName": job["Props"]["Batch"],
                 "Name": job_name,
                 "UserName": job["Props"]["User"],
-                "Comment": instance.context.data.get("comment", ""),
+                "Comment": context_data.get("comment", ""),
 
                 "Department": self.deadline_department,
                 "ChunkSize": 1,
@@ -251,10 +327,13 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
                 "InitialStatus": initial_status,
 
                 "Group": self.deadline_group,
-                "Pool": self.deadline_pool or instance.data.get("primaryPool"),
-                "SecondaryPool": secondary_pool,
+                "Pool": self.deadline_pool or instance_data.get("primaryPool"),
                 # ensure the outputdirectory with correct slashes
-                "OutputDirectory0": output_dir.replace("\\", "/")
+                "OutputDirectory0": output_dir.translate(_SLASH_TABLE),
+
+                **secondary_pool_items,
+                **dependency_items,
+                **environment_items,
             },
             "PluginInfo": {
                 "Version": self.plugin_pype_version,
@@ -265,51 +344,61 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             "AuxFiles": [],
         }
 
-        # add assembly jobs as dependencies
-        if instance.data.get("tileRendering"):
-            self.log.info("Adding tile assembly jobs as dependencies...")
-            job_index = 0
-            for assembly_id in instance.data.get("assemblySubmissionJobs"):
-                payload["JobInfo"]["JobDependency{}".format(
-                    job_index)] = assembly_id  # noqa: E501
-                job_index += 1
-        elif instance.data.get("bakingSubmissionJobs"):
-            self.log.info(
-                "Adding baking submission jobs as dependencies..."
-            )
-            job_index = 0
-            for assembly_id in instance.data["bakingSubmissionJobs"]:
-                payload["JobInfo"]["JobDependency{}".format(
-                    job_index)] = assembly_id  # noqa: E501
-                job_index += 1
-        elif job.get("_id"):
-            payload["JobInfo"]["JobDependency0"] = job["_id"]
-
-        for index, (key_, value_) in enumerate(environment.items()):
-            payload["JobInfo"].update(
-                {
-                    "EnvironmentKeyValue%d"
-                    % index: "{key}={value}".format(
-                        key=key_, value=value_
-                    )
-                }
-            )
-        # remove secondary pool
-        payload["JobInfo"].pop("SecondaryPool", None)
+        self.log.debug("Queueing Deadline publish job ...")
 
-        self.log.debug("Submitting Deadline publish job ...")
+        context_data.setdefault(
+            "deadlinePublishJobQueue", []
+        ).append({
+            "url": "{}/api/jobs".format(self.deadline_url),
+            "auth": instance_data["deadline"]["auth"],
+            "verify": instance_data["deadline"]["verify"],
+            "payload": payload,
+            "publish_job": publish_job,
+            "metadata_path": metadata_path,
+        })
 
-        url = "{}/api/jobs".format(self.deadline_url)
-        auth = instance.data["deadline"]["auth"]
-        verify = instance.data["deadline"]["verify"]
-        response = requests_post(
-            url, json=payload, timeout=10, auth=auth, verify=verify)
-        if not response.ok:
-            raise Exception(response.text)
+    def _get_publish_job_environment(self, context):
+        """Get environment of publish jobs.
 
-        deadline_publish_job_id = response.json()["_id"]
+        The environment is the same for all instances of the context, so it
+        is created only once and cached on the context.
 
-        return deadline_publish_job_id
+        Args:
+            context (pyblish.api.Context): Publish context.
+
+        Returns:
+            dict[str, str]: Environment variables of publish job.
+        """
+        environment = context.data.get("deadlinePublishJobEnvironment")
+        if environment is not None:
+            return environment
+
+        context_data = context.data
+        env = os.environ
+        settings_variant = env["AYON_DEFAULT_SETTINGS_VARIANT"]
+        environment = {
+            "AYON_PROJECT_NAME": context_data["projectName"],
+            "AYON_FOLDER_PATH": context_data["folderPath"],
+            "AYON_TASK_NAME": context_data["task"],
+            "AYON_USERNAME": context_data["user"],
+            "AYON_LOG_NO_COLORS": "1",
+            "AYON_IN_TESTS": str(int(is_in_tests())),
+            "AYON_PUBLISH_JOB": "1",
+            "AYON_RENDER_JOB": "0",
+            "AYON_REMOTE_PUBLISH": "0",
+            "AYON_BUNDLE_NAME": env["AYON_BUNDLE_NAME"],
+            "AYON_DEFAULT_SETTINGS_VARIANT": settings_variant,
+        }
+
+        # add environments from self.environ_keys
+        environment.update({
+            env_key: env[env_key]
+            for env_key in self.environ_keys
+            if env.get(env_key)
+        })
+
+        context_data["deadlinePublishJobEnvironment"] = environment
+        return environment
 
     def process(self, instance):
         # type: (pyblish.api.Instance) -> None
@@ -323,11 +412,14 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             instance (pyblish.api.Instance): Instance data.
 
         """
-        if not instance.data.get("farm"):
+        instance_data = instance.data
+        context_data = instance.context.data
+
+        if not instance_data.get("farm"):
             self.log.debug("Skipping local instance.")
             return
 
-        anatomy = instance.context.data["anatomy"]
+        anatomy = context_data["anatomy"]
 
         instance_skeleton_data = create_skeleton_instance(
             instance, families_transfer=self.families_transfer,
@@ -374,15 +466,19 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         `foo` and `xxx`
         """
         do_not_add_review = False
-        if instance.data.get("review") is False:
+        if instance_data.get("review") is False:
             self.log.debug("Instance has review explicitly disabled.")
             do_not_add_review = True
 
-        aov_filter = {
-            item["name"]: item["value"]
-            for item in self.aov_filter
-        }
-        if isinstance(instance.data.get("expectedFiles")[0], dict):
+        aov_filter = self._get_aov_filter()
+        expected_files = instance_data.get("expectedFiles") or []
+        expected_files_kind = instance_data.get("expectedFilesKind")
+        if expected_files_kind is None:
+            expected_files_kind = "file_list"
+            if expected_files and isinstance(expected_files[0], dict):
+                expected_files_kind = "aov_map"
+
+        if expected_files_kind == "aov_map":
             instances = create_instances_for_aov(
                 instance, instance_skeleton_data,
                 aov_filter,
@@ -392,7 +488,7 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         else:
             representations = prepare_representations(
                 instance_skeleton_data,
-                instance.data.get("expectedFiles"),
+                expected_files,
                 anatomy,
                 aov_filter,
                 self.skip_integration_repre_list,
@@ -409,10 +505,9 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             instances = [instance_skeleton_data]
 
         # attach instances to product
-        if instance.data.get("attachTo"):
-            instances = attach_instances_to_product(
-                instance.data.get("attachTo"), instances
-            )
+        attach_to = instance_data.get("attachTo")
+        if attach_to:
+            instances = attach_instances_to_product(attach_to, instances)
 
         r''' SUBMiT PUBLiSH JOB 2 D34DLiN3
           ____
@@ -424,8 +519,8 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
 
         '''
 
-        render_job = instance.data.pop("deadlineSubmissionJob", None)
-        if not render_job and instance.data.get("tileRendering") is False:
+        render_job = instance_data.pop("deadlineSubmissionJob", None)
+        if not render_job and instance_data.get("tileRendering") is False:
             raise AssertionError(("Cannot continue without valid "
                                   "Deadline submission."))
         if not render_job:
@@ -439,15 +534,15 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             #
             # Batch name reflect original scene name
 
-            if instance.data.get("assemblySubmissionJobs"):
-                render_job["Props"]["Batch"] = instance.data.get(
+            if instance_data.get("assemblySubmissionJobs"):
+                render_job["Props"]["Batch"] = instance_data.get(
                     "jobBatchName")
             else:
                 batch = os.path.splitext(os.path.basename(
-                    instance.context.data.get("currentFile")))[0]
+                    context_data.get("currentFile")))[0]
                 render_job["Props"]["Batch"] = batch
             # User is deadline user
-            render_job["Props"]["User"] = instance.context.data.get(
+            render_job["Props"]["User"] = context_data.get(
                 "deadlineUser", getpass.getuser())
 
             render_job["Props"]["Env"] = {
@@ -457,15 +552,12 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             }
 
         # get default deadline webservice url from deadline module
-        self.deadline_url = instance.data["deadline"]["url"]
+        self.deadline_url = instance_data["deadline"]["url"]
         assert self.deadline_url, "Requires Deadline Webservice URL"
 
-        deadline_publish_job_id = \
-            self._submit_deadline_post_job(instance, render_job, instances)
-
         # Inject deadline url to instances to query DL for job id for overrides
         for inst in instances:
-            inst["deadline"] = instance.data["deadline"]
+            inst["deadline"] = instance_data["deadline"]
 
         # publish job file
         publish_job = {
@@ -474,27 +566,25 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
             "frameEnd": instance_skeleton_data["frameEnd"],
             "fps": instance_skeleton_data["fps"],
             "source": instance_skeleton_data["source"],
-            "user": instance.context.data["user"],
-            "version": instance.context.data["version"],  # workfile version
-            "intent": instance.context.data.get("intent"),
-            "comment": instance.context.data.get("comment"),
+            "user": context_data["user"],
+            "version": context_data["version"],  # workfile version
+            "intent": context_data.get("intent"),
+            "comment": context_data.get("comment"),
             "job": render_job or None,
             "instances": instances
         }
 
-        if deadline_publish_job_id:
-            publish_job["deadline_publish_job_id"] = deadline_publish_job_id
-
         # add audio to metadata file if available
-        audio_file = instance.context.data.get("audioFile")
+        audio_file = context_data.get("audioFile")
         if audio_file and os.path.isfile(audio_file):
             publish_job.update({"audio": audio_file})
 
         metadata_path, rootless_metadata_path = \
             create_metadata_path(instance, anatomy)
 
-        with open(metadata_path, "w") as f:
-            json.dump(publish_job, f, indent=4, sort_keys=True)
+        self._submit_deadline_post_job(
+            instance, render_job, instances, publish_job,
+            metadata_path, rootless_metadata_path)
 
     def _get_publish_folder(self, anatomy, template_data,
                             folder_entity, product_name, context,
@@ -529,16 +619,14 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         project_name = context.data["projectName"]
         host_name = context.data["hostName"]
         if not version:
-            version_entity = None
+            last_version = None
             if folder_entity:
-                version_entity = ayon_api.get_last_version_by_product_name(
-                    project_name,
-                    product_name,
-                    folder_entity["id"]
+                last_version = self._get_last_version(
+                    context, product_name, folder_entity["id"]
                 )
 
-            if version_entity:
-                version = int(version_entity["version"]) + 1
+            if last_version is not None:
+                version = last_version + 1
             else:
                 version = get_versioning_start(
                     project_name,
@@ -553,13 +641,23 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         host_name = context.data["hostName"]
         task_info = template_data.get("task") or {}
 
-        template_name = publish.get_publish_template_name(
-            project_name,
-            host_name,
-            product_type,
-            task_info.get("name"),
-            task_info.get("type"),
+        # Instances of one context mostly share product type and task
+        template_names = context.data.setdefault(
+            "deadlinePublishTemplateNames", {}
+        )
+        template_key = (
+            product_type, task_info.get("name"), task_info.get("type")
         )
+        template_name = template_names.get(template_key)
+        if template_name is None:
+            template_name = publish.get_publish_template_name(
+                project_name,
+                host_name,
+                product_type,
+                task_info.get("name"),
+                task_info.get("type"),
+            )
+            template_names[template_key] = template_name
 
         template_data["version"] = version
         template_data["subset"] = product_name
@@ -574,6 +672,31 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
         )
         return render_dir_template.format_strict(template_data)
 
+    def _get_last_version(self, context, product_name, folder_id):
+        """Get last version number of product from AYON server.
+
+        Last versions of all products in the folder are cached on context,
+        usually prefetched by 'PrefetchPublishJobLastVersions' for all
+        folders at once, so instances don't query the server again.
+
+        Args:
+            context (pyblish.api.Context): Publish context.
+            product_name (str): Product name.
+            folder_id (str): Folder id.
+
+        Returns:
+            Union[int, None]: Last version number or None if product does
+                not have any version yet.
+        """
+        last_versions_by_folder = context.data.setdefault(
+            "deadlineLastVersions", {}
+        )
+        if folder_id not in last_versions_by_folder:
+            last_versions_by_folder.update(get_last_versions_by_folder(
+                context.data["projectName"], {folder_id}
+            ))
+        return last_versions_by_folder[folder_id].get(product_name)
+
     @classmethod
     def get_attribute_defs(cls):
         return [
@@ -582,3 +705,43 @@ class ProcessSubmittedJobOnFarm(pyblish.api.InstancePlugin,
                     items=["Active", "Suspended"],
                     default="Active")
         ]
+
+
+class PrefetchPublishJobLastVersions(pyblish.api.ContextPlugin):
+    """Query last versions of products for all farm instances at once.
+
+    `ProcessSubmittedJobOnFarm` needs last version of each published
+    product to resolve publish folder. Product names are resolved per AOV
+    only during its processing, so last versions of all products in
+    folders of its instances are queried here in bulk instead of once
+    per instance.
+    """
+
+    label = "Prefetch Last Versions for Publish Jobs"
+    order = ProcessSubmittedJobOnFarm.order - 0.01
+
+    targets = ["local"]
+
+    hosts = ProcessSubmittedJobOnFarm.hosts
+
+    def process(self, context):
+        folder_ids = {
+            instance.data["folderEntity"]["id"]
+            for instance in pyblish.api.instances_by_plugin(
+                context, ProcessSubmittedJobOnFarm
+            )
+            if (
+                instance.data.get("publish", True)
+                and instance.data.get("farm")
+                and instance.data.get("folderEntity")
+            )
+        }
+        if not folder_ids:
+            self.log.debug("No farm instances to prefetch last versions.")
+            return
+
+        context.data.setdefault("deadlineLastVersions", {}).update(
+            get_last_versions_by_folder(
+                context.data["projectName"], folder_ids
+            )
+        )
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Submit queued publish jobs to Deadline."""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pyblish.api
+
+from ayon_deadline.abstract_submit_deadline import requests_post
+
+
+class SubmitQueuedPublishJobs(pyblish.api.ContextPlugin):
+    """Submit publish jobs queued by `ProcessSubmittedJobOnFarm`.
+
+    Deadline Webservice does not provide an end-point to submit multiple
+    jobs in one request, so all queued jobs are posted concurrently instead
+    of one after another.
+
+    Metadata file of each publish job is written as soon as its Deadline
+    job id is known. Jobs which failed to submit are reported together
+    after all other jobs were processed.
+    """
+
+    label = "Submit Queued Publish Jobs to Deadline"
+    order = pyblish.api.IntegratorOrder + 0.21
+    icon = "tractor"
+
+    targets = ["local"]
+
+    max_workers = 16
+
+    def process(self, context):
+        queue = context.data.pop("deadlinePublishJobQueue", None)
+        if not queue:
+            self.log.debug("No queued Deadline publish jobs.")
+            return
+
+        self.log.debug(
+            "Submitting {} Deadline publish job(s) ...".format(len(queue)))
+
+        max_workers = min(self.max_workers, len(queue))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self._submit_job, item)
+                for item in queue
+            ]
+
+        errors = []
+        for item, future in zip(queue, futures):
+            try:
+                future.result()
+            except Exception as exc:
+                self.log.error(
+                    "Failed to submit '{}'".format(
+                        item["payload"]["JobInfo"]["Name"]),
+                    exc_info=True
+                )
+                errors.append(str(exc))
+
+        if errors:
+            raise Exception("\n".join(errors))
+
+    def _submit_job(self, item):
+        """Post single queued publish job to Deadline.
+
+        Metadata file is written right after the job is submitted, as
+        a publish job without dependencies may start right away.
+        """
+        response = requests_post(
+            item["url"],
+            json=item["payload"],
+            timeout=10,
+            auth=item["auth"],
+            verify=item["verify"]
+        )
+        if not response.ok:
+            raise Exception(response.text)
+
+        publish_job = item["publish_job"]
+        publish_job["deadline_publish_job_id"] = response.json()["_id"]
+        self._write_metadata(item["metadata_path"], publish_job)
+
+    def _write_metadata(self, metadata_path, publish_job):
+        """Write publish job metadata json file."""
+        with open(metadata_path, "w") as f:
+            json.dump(publish_job, f, indent=4, sort_keys=True)
@@ -365,6 +365,7 @@ class HarmonySubmitDeadline(
 
         self._instance.data["source"] = str(published_scene.as_posix())
         self._instance.data["expectedFiles"] = new_expected_files
+        self._instance.data["expectedFilesKind"] = "file_list"
         harmony_plugin_info = PluginInfo(
             SceneFile=xstage_path.as_posix(),
             Version=(
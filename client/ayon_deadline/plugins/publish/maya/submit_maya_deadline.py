@@ -365,8 +365,9 @@ class MayaSubmitDeadline(abstract_submit_deadline.AbstractSubmitDeadline,
         plugin_info["ImageWidth"] = instance.data.get("resolutionWidth")
         plugin_info["RegionRendering"] = True
 
+        # frame number anchored to the extension, used with `search`
         R_FRAME_NUMBER = re.compile(
-            r".+\.(?P<frame>[0-9]+)\..+")  # noqa: N806, E501
+            r"\.(?P<frame>[0-9]+)\.[^.]+$")  # noqa: N806, E501
         REPL_FRAME_NUMBER = re.compile(
             r"(.+\.)([0-9]+)(\..+)")  # noqa: N806, E501
 
@@ -395,7 +396,7 @@ class MayaSubmitDeadline(abstract_submit_deadline.AbstractSubmitDeadline,
         frame_payloads = {}
         file_index = 1
         for file in files:
-            frame = re.search(R_FRAME_NUMBER, file).group("frame")
+            frame = R_FRAME_NUMBER.search(file).group("frame")
 
             new_job_info = copy.deepcopy(job_info)
             new_job_info.Name += " (Frame {} - {} tiles)".format(frame,
@@ -470,7 +471,7 @@ class MayaSubmitDeadline(abstract_submit_deadline.AbstractSubmitDeadline,
         output_dir = self.job_info.OutputDirectory[0]
         config_files = []
         for file in assembly_files:
-            frame = re.search(R_FRAME_NUMBER, file).group("frame")
+            frame = R_FRAME_NUMBER.search(file).group("frame")
 
             frame_assembly_job_info = copy.deepcopy(assembly_job_info)
             frame_assembly_job_info.Name += " (Frame {})".format(frame)
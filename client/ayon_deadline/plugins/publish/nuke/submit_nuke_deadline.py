@@ -473,6 +473,7 @@ class NukeSubmitDeadline(pyblish.api.InstancePlugin,
         """
         if not instance.data.get("expectedFiles"):
             instance.data["expectedFiles"] = []
+        instance.data["expectedFilesKind"] = "file_list"
 
         dirname = os.path.dirname(filepath)
         file = os.path.basename(filepath)